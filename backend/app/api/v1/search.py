@@ -1,12 +1,15 @@
 # app/api/v1/search.py
-from typing import List, Dict, Any, Set
+from dataclasses import dataclass
+from typing import List, Dict, Any, Optional, Set, Tuple
 import re
+import threading
 
-from fastapi import APIRouter, Depends, Query
+import numpy as np
+from cachetools import TTLCache
+from fastapi import APIRouter, Query
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
-from sqlalchemy.orm import Session
 
-from app.db.session import get_db
 from app.services.embeddings import semantic_search
 from app.services.llm import answer_with_rag
 from app.services.graph import (
@@ -16,6 +19,21 @@ from app.services.graph import (
 
 router = APIRouter(tags=["search"])
 
+# Number of products returned to the UI
+TOP_N = 6
+# Max Qdrant hits turned into RAG context chunks for the LLM
+MAX_RAG_CHUNKS = 8
+# Top hit at/above this cosine score → skip the KG context lookup and
+# send only the first CONFIDENT_RAG_CHUNKS chunks to the LLM
+KG_SKIP_SCORE = 0.85
+CONFIDENT_RAG_CHUNKS = 3
+
+# L1 cache: exact (normalized) query → full response payload.
+# Repeated popular queries skip embedder, Qdrant, KG and LLM entirely;
+# the TTL lets catalog updates show up within a few minutes.
+_response_cache: TTLCache = TTLCache(maxsize=1024, ttl=300)
+_response_cache_lock = threading.Lock()
+
 
 # ---------------------------------------------------------
 #  Minimal category synonyms (query language → category)
@@ -51,18 +69,79 @@ CATEGORY_SYNONYMS: Dict[str, List[str]] = {
 }
 
 
+def _build_category_index() -> tuple[Dict[str, str], Dict[str, re.Pattern]]:
+    """
+    Inverted index over CATEGORY_SYNONYMS, built once at import time:
+    - single-word synonyms → category (one dict lookup per query token)
+    - multi-word synonyms not already covered by one of their own words
+      (e.g. "hooded jacket") → one compiled phrase pattern per category
+    """
+    word_to_cat: Dict[str, str] = {}
+    for cat, syns in CATEGORY_SYNONYMS.items():
+        for syn in syns:
+            if " " not in syn:
+                word_to_cat.setdefault(syn, cat)
+
+    phrase_re: Dict[str, re.Pattern] = {}
+    for cat, syns in CATEGORY_SYNONYMS.items():
+        phrases = [
+            syn
+            for syn in syns
+            if " " in syn
+            and not any(word_to_cat.get(w) == cat for w in syn.split())
+        ]
+        if phrases:
+            phrase_re[cat] = re.compile(
+                r"\b(?:" + "|".join(map(re.escape, phrases)) + r")s?\b"
+            )
+    return word_to_cat, phrase_re
+
+
+_WORD_TO_CAT, _PHRASE_RE = _build_category_index()
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:-[a-z0-9]+)*")
+
+
 def detect_intent_category(query: str) -> str | None:
     """
     Guess which logical category the user is talking about
     (hoodie / tshirt / shorts) using a small synonyms map.
+
+    Matches whole tokens only (so "laptop" doesn't count as "top"),
+    allowing a plural "s". Hyphenated tokens are tried whole first
+    ("t-shirt"), then part by part ("tank-top" → "top").
     """
     q = query.lower()
-    for cat, syns in CATEGORY_SYNONYMS.items():
-        if any(syn in q for syn in syns):
+    hits: Set[str] = set()
+    for tok in _TOKEN_RE.findall(q):
+        cat = _lookup_category_word(tok)
+        if cat is None and "-" in tok:
+            for part in tok.split("-"):
+                cat = _lookup_category_word(part)
+                if cat is not None:
+                    hits.add(cat)
+        elif cat is not None:
+            hits.add(cat)
+
+    # Phrases are stored with spaces: "hooded-jacket" → "hooded jacket"
+    q_phrase = q.replace("-", " ")
+
+    # Keep the synonyms map's category priority
+    for cat in CATEGORY_SYNONYMS:
+        if cat in hits:
+            return cat
+        rx = _PHRASE_RE.get(cat)
+        if rx is not None and rx.search(q_phrase):
             return cat
     return None
 
 
+def _lookup_category_word(tok: str) -> str | None:
+    cat = _WORD_TO_CAT.get(tok)
+    if cat is None and tok.endswith("s"):
+        cat = _WORD_TO_CAT.get(tok[:-1])
+    return cat
+
+
 def enrich_query(query: str, category: str | None) -> str:
     """
     Append a few synonyms to the query so embeddings
@@ -146,38 +225,115 @@ class SearchRequest(BaseModel):
     query: str
 
 
-def _compute_mention_bonus(prod: Dict[str, Any], answer_text: str) -> float:
+# Declared response shape: FastAPI serializes it straight to JSON bytes
+# through Pydantic instead of jsonable_encoder + json.dumps.
+class SearchResult(BaseModel):
+    id: int
+    title: str
+    category: str
+    price: Optional[float] = None
+    description: str
+    image_url: str
+    product_url: str
+    score: float
+
+
+class SearchResponse(BaseModel):
+    answer: str
+    results: List[SearchResult]
+
+
+@dataclass(slots=True)
+class Hit:
+    """One Qdrant hit, flattened once so later steps don't re-parse it."""
+
+    pid: int
+    score: float
+    payload: Dict[str, Any]
+
+    def to_result(self) -> Dict[str, Any]:
+        payload = self.payload
+        return {
+            "id": self.pid,
+            "title": payload.get("title") or "",
+            "category": payload.get("category") or "",
+            "price": payload.get("price"),
+            "description": payload.get("description") or "",
+            "image_url": payload.get("image_url") or "",
+            "product_url": payload.get("product_url") or "",
+            "score": self.score,
+        }
+
+    def to_rag_chunk(self) -> str:
+        payload = self.payload
+        return (
+            f"Title: {payload.get('title') or ''}\n"
+            f"Category: {payload.get('category') or ''}\n"
+            f"Price: {payload.get('price')}\n"
+            f"Description: {payload.get('description') or ''}\n"
+            f"Snippet: {payload.get('chunk_text') or ''}"
+        )
+
+
+_WORD_RE = re.compile(r"[a-z]{4,}")
+
+
+def _compute_mention_bonus(
+    prod: Dict[str, Any],
+    answer_text: str,
+    answer_tokens: Set[str],
+) -> float:
     """
     Give extra score if product title/category words appear in LLM answer.
     This forces the items the bot explicitly talks about to the top.
+
+    `answer_text` is the lowercased answer and `answer_tokens` its words
+    of 4+ letters, both computed once per request by the caller.
     """
     if not answer_text:
         return 0.0
 
-    ans = answer_text.lower()
     title = (prod.get("title") or "").lower()
     category = (prod.get("category") or "").lower()
 
     bonus = 0.0
 
-    # Full title match (strong)
-    if title and title in ans:
+    title_tokens = _WORD_RE.findall(title)
+    matched = [tok for tok in title_tokens if tok in answer_tokens]
+
+    # Full title match (strong) — only possible if some title word overlaps
+    if title and (matched or not title_tokens) and title in answer_text:
         bonus += 0.7
     else:
         # Partial title word matches (medium)
-        for tok in title.replace("-", " ").split():
-            tok = tok.strip()
-            if len(tok) >= 4 and tok in ans:
-                bonus += 0.15
+        bonus += 0.15 * len(matched)
 
     # Category name mentioned (small)
-    if category and category in ans:
+    if category and category in answer_text:
         bonus += 0.1
 
     return bonus
 
 
-def _run_search(query: str, db: Session) -> Dict[str, Any]:
+async def _run_search(query: str) -> Dict[str, Any]:
+    key = (query.strip().lower(), TOP_N)
+    with _response_cache_lock:
+        cached = _response_cache.get(key)
+    if cached is not None:
+        return cached
+
+    result, cacheable = await _search_uncached(query)
+
+    # Degraded responses (no hits, KG down, LLM fallback message) are
+    # not cached, so the next identical query gets a fresh attempt.
+    if cacheable:
+        with _response_cache_lock:
+            _response_cache[key] = result
+    return result
+
+
+async def _search_uncached(query: str) -> Tuple[Dict[str, Any], bool]:
+    """Returns (response, cacheable)."""
     # 1) Understand intent from the query
     intent_category = detect_intent_category(query)          # e.g. "hoodie"
     max_price = extract_max_price(query)                     # e.g. 2000
@@ -189,9 +345,11 @@ def _run_search(query: str, db: Session) -> Dict[str, Any]:
     # 2) Ask Neo4j KG for conceptual candidate product_ids
     #    This uses true categories + feature nodes.
     kg_candidate_ids: Set[int] = set()
+    kg_failed = False
     if intent_category or max_price or tags:
         try:
-            kg_ids = get_candidate_product_ids_from_kg(
+            kg_ids = await run_in_threadpool(
+                get_candidate_product_ids_from_kg,
                 category_hint=intent_category,  # can be None
                 max_price=max_price,            # can be None
                 tags=tags,                      # can be []
@@ -200,9 +358,10 @@ def _run_search(query: str, db: Session) -> Dict[str, Any]:
         except Exception:
             # If KG is off / down, don't break search – just skip KG filter.
             kg_candidate_ids = set()
+            kg_failed = True
 
     # 3) Vector search in Qdrant (semantic layer)
-    points = semantic_search(enriched_query, limit=20)
+    points = await semantic_search(enriched_query, limit=20)
     if not points:
         msg = "I couldn't find any relevant products."
         if intent_category:
@@ -210,62 +369,21 @@ def _run_search(query: str, db: Session) -> Dict[str, Any]:
                 f"I couldn't find any strong matches for {intent_category}s. "
                 "Try rephrasing or relaxing your constraints."
             )
-        return {"answer": msg, "results": []}
-
-    rag_chunks: List[str] = []
-    product_map: Dict[int, Dict[str, Any]] = {}
-    product_scores: List[tuple[int, float]] = []
-
-    for p in points:
-        payload = p.payload or {}
-        pid = payload.get("product_id")
-        if pid is None:
-            continue
-
-        title = payload.get("title") or ""
-        category = payload.get("category") or ""
-        price = payload.get("price")
-        description = payload.get("description") or ""
-        image_url = payload.get("image_url") or ""
-        product_url = payload.get("product_url") or ""
-        chunk_text = payload.get("chunk_text") or ""
-
-        score = float(p.score or 0.0)
-
-        # Build RAG context out of all relevant chunks
-        rag_chunks.append(
-            f"Title: {title}\n"
-            f"Category: {category}\n"
-            f"Price: {price}\n"
-            f"Description: {description}\n"
-            f"Snippet: {chunk_text}"
-        )
-
-        # Keep best score per product
-        if pid not in product_map or score > product_map[pid]["score"]:
-            product_map[pid] = {
-                "id": pid,
-                "title": title,
-                "category": category,
-                "price": price,
-                "description": description,
-                "image_url": image_url,
-                "product_url": product_url,
-                "score": score,
-            }
-
-        product_scores.append((pid, score))
-
-    if not product_map:
-        return {"answer": "I couldn't find any relevant products.", "results": []}
-
-    # 4) Order products by raw semantic score
-    ordered_ids: List[int] = []
-    seen_ids: Set[int] = set()
-    for pid, _ in sorted(product_scores, key=lambda x: -x[1]):
-        if pid not in seen_ids:
-            ordered_ids.append(pid)
-            seen_ids.add(pid)
+        return {"answer": msg, "results": []}, False
+
+    # Single pass over the hits; strings are only built for what we use
+    hits: List[Hit] = [
+        Hit(pid=p.payload["product_id"], score=float(p.score or 0.0), payload=p.payload)
+        for p in points
+        if p.payload and p.payload.get("product_id") is not None
+    ]
+    if not hits:
+        return {"answer": "I couldn't find any relevant products.", "results": []}, False
+
+    # 4) Hits are already one per product, ordered by raw semantic score
+    hit_map: Dict[int, Hit] = {h.pid: h for h in hits}
+    product_map: Dict[int, Dict[str, Any]] = {h.pid: h.to_result() for h in hits}
+    ordered_ids: List[int] = [h.pid for h in hits]
 
     # 4b) HYBRID: if KG returned candidates, restrict to them.
     #     This is where Neo4j actually influences what we surface.
@@ -278,50 +396,62 @@ def _run_search(query: str, db: Session) -> Dict[str, Any]:
     base_results = [product_map[pid] for pid in ordered_ids]
 
     # 5) Add KG conceptual context for these products for RAG
-    kg_chunks = get_kg_context_for_products(ordered_ids)
-    rag_chunks.extend(kg_chunks)
+    #    (skipped when the top vector hit is already a confident match —
+    #    saves a Neo4j round-trip and keeps the prompt short)
+    # RAG context from the top products actually shown (after the KG
+    # filter), so the LLM never recommends something the UI dropped.
+    if product_map[ordered_ids[0]]["score"] >= KG_SKIP_SCORE:
+        rag_chunks = [hit_map[pid].to_rag_chunk() for pid in ordered_ids[:CONFIDENT_RAG_CHUNKS]]
+    else:
+        rag_chunks = [hit_map[pid].to_rag_chunk() for pid in ordered_ids[:MAX_RAG_CHUNKS]]
+        kg_chunks = await run_in_threadpool(get_kg_context_for_products, ordered_ids)
+        rag_chunks.extend(kg_chunks)
 
     # 6) Ask LLM to synthesize an answer
-    answer = answer_with_rag(query, rag_chunks)
-    answer_text = answer or ""
+    answer_text, from_model = await answer_with_rag(query, rag_chunks)
     answer_lower = answer_text.lower()
+    answer_tokens: Set[str] = set(_WORD_RE.findall(answer_lower))
 
     # 7) Re-rank products so the ones explicitly mentioned by LLM
     #    (by title / category) float to the top.
-    def final_score(prod: Dict[str, Any]) -> float:
-        base = float(prod.get("score") or 0.0)
-        bonus = _compute_mention_bonus(prod, answer_lower)
-        return base + bonus
-
-    reranked_results = sorted(base_results, key=final_score, reverse=True)
+    #    Keys are computed once into an array, then one stable argsort.
+    final_scores = np.fromiter(
+        (
+            float(prod.get("score") or 0.0)
+            + _compute_mention_bonus(prod, answer_lower, answer_tokens)
+            for prod in base_results
+        ),
+        dtype=np.float64,
+        count=len(base_results),
+    )
+    order = np.argsort(-final_scores, kind="stable")
 
     # 8) Keep only top-N for UI cleanliness
-    TOP_N = 6
-    final_results = reranked_results[:TOP_N]
+    final_results = [base_results[i] for i in order[:TOP_N]]
 
-    return {"answer": answer_text, "results": final_results}
+    return {"answer": answer_text, "results": final_results}, from_model and not kg_failed
 
 
 @router.get(
     "/search",
+    response_model=SearchResponse,
     summary="Semantic product search with RAG + KG + LLM-aware ranking",
 )
-def search_products(
+async def search_products(
     query: str = Query(..., description="User question or search query"),
-    db: Session = Depends(get_db),
 ):
-    return _run_search(query, db)
+    return await _run_search(query)
 
 
 @router.post(
     "/search",
+    response_model=SearchResponse,
     summary="Semantic product search with RAG + KG + LLM-aware ranking",
 )
-def search_products_post(
+async def search_products_post(
     body: SearchRequest,
-    db: Session = Depends(get_db),
 ):
     """
     POST variant so the frontend can send JSON: { "query": "hoodies under 2000" }.
     """
-    return _run_search(body.query, db)
+    return await _run_search(body.query)
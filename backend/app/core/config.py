@@ -14,14 +14,24 @@ class Settings(BaseSettings):
     QDRANT_URL: str
     QDRANT_API_KEY: str
     QDRANT_COLLECTION: str = "products_collection_minilm"
+    # gRPC (binary protobuf, HTTP/2 keep-alive) instead of REST/JSON
+    QDRANT_PREFER_GRPC: bool = True
+    QDRANT_GRPC_PORT: int = 6334
+    QDRANT_TIMEOUT: int = 5
 
     # Embedding model
     BGE_MODEL_NAME: str = "sentence-transformers/all-MiniLM-L6-v2"
     EMBEDDING_DIM: int = 384
+    # Worker processes for query encoding (0 = encode in the API process).
+    # Each worker loads its own copy of torch + the model, so only raise
+    # this on instances with RAM to spare (not the 512 MB Render tier).
+    EMBEDDER_PROCESSES: int = 0
 
     # LLMs
     GROQ_API_KEY: str
     OPENAI_API_KEY: str
+    # In-process answer cache (turn off for A/B tests on prompts/models)
+    LLM_CACHE_ENABLED: bool = True
 
     # Neo4j (Knowledge Graph)
     # KG is OFF by default; turn it on later via .env
@@ -29,6 +39,13 @@ class Settings(BaseSettings):
     NEO4J_URI: str = "neo4j+s://df6ecb3e.databases.neo4j.io"
     NEO4J_USER: str = "neo4j"
     NEO4J_PASSWORD: str | None = None
+    NEO4J_DATABASE: str = "neo4j"
+    # Driver connection pool (shared by all requests / threads)
+    NEO4J_POOL_SIZE: int = 50
+    NEO4J_ACQUISITION_TIMEOUT: float = 60.0
+    # Retry budget for transient errors; ping idle connections before reuse
+    NEO4J_MAX_RETRY_TIME: float = 15.0
+    NEO4J_LIVENESS_CHECK_TIMEOUT: float = 30.0
 
     model_config = SettingsConfigDict(
         env_file=".env",
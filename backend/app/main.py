@@ -1,4 +1,6 @@
 # app/main.py
+import logging
+
 from fastapi import FastAPI, Request
 from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
@@ -6,10 +8,25 @@ from fastapi.middleware.cors import CORSMiddleware
 from app.core.config import settings
 from app.api.v1 import health, products, search, scrape
 from app.db.session import SessionLocal
-from app.services.embeddings import index_all_products
+from app.services.embeddings import (
+    index_all_products,
+    preload_vectors,
+    start_query_encoder,
+    stop_query_encoder,
+    warmup_query_encoder,
+)
 from app.services.graph import sync_products_to_graph
+from app.services.llm import close_llm_clients
 from app.models.product import Product
 
+# uvicorn only configures its own loggers — without this, app-level
+# logger.info() messages (KG sync status etc.) are silently dropped.
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s %(levelname)s %(name)s: %(message)s",
+)
+# httpx logs every LLM request at INFO — too chatty at this level
+logging.getLogger("httpx").setLevel(logging.WARNING)
 
 
 def create_app() -> FastAPI:
@@ -63,12 +80,17 @@ def create_app() -> FastAPI:
             # 1) Qdrant embeddings (runs only if already empty)
             emb_chunks = index_all_products(db, skip_if_indexed=True)
 
-            # 2) Neo4j KG (only if NEO4J_ENABLED=True)
+            # 1b) Small catalogs: keep all vectors in RAM for local search
+            preloaded = preload_vectors()
+
+            # 2) Neo4j KG (only if NEO4J_ENABLED=True) — full catalog,
+            #    so products deleted from the DB can be pruned too
             products = db.query(Product).all()
-            kg_nodes = sync_products_to_graph(products, skip_if_exists=True)
+            kg_nodes = sync_products_to_graph(products, skip_if_exists=True, prune=True)
 
             print(
                 f"✨ Embedding products indexed (new): {emb_chunks}, "
+                f"vectors preloaded: {preloaded}, "
                 f"KG products synced (new): {kg_nodes}"
             )
         except Exception as e:
@@ -77,6 +99,26 @@ def create_app() -> FastAPI:
         finally:
             db.close()
 
+    # ---------- query encoder (micro-batching) ----------
+    # Always prewarm the embedder (worker processes, or this process when
+    # there is no pool) — even if sync was skipped or failed, it's still
+    # needed for every search request.
+    @app.on_event("startup")
+    async def startup_query_encoder():
+        start_query_encoder()
+        try:
+            await warmup_query_encoder()
+        except Exception as e:
+            print("❌ Error while warming up query encoder:", e)
+
+    @app.on_event("shutdown")
+    async def shutdown_query_encoder():
+        await stop_query_encoder()
+
+    @app.on_event("shutdown")
+    async def shutdown_llm_clients():
+        await close_llm_clients()
+
     return app
 
 
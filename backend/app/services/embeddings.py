@@ -1,6 +1,16 @@
 # app/services/embeddings.py
-from typing import List, Optional
-
+from collections import OrderedDict
+from dataclasses import dataclass
+from concurrent.futures import Executor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Iterable, Iterator, List, Optional, Tuple
+import asyncio
+import itertools
+import multiprocessing
+import threading
+import time
+
+import numpy as np
 from qdrant_client import QdrantClient
 from qdrant_client.http import models as qmodels
 from sentence_transformers import SentenceTransformer
@@ -14,10 +24,126 @@ from app.models.product import Product
 _embedder: Optional[SentenceTransformer] = None
 _qdrant: Optional[QdrantClient] = None
 _VECTOR_DIM: Optional[int] = None
+_collection_ready: bool = False
 
 # 👉 Must match "Vector name" in Qdrant collection UI
 QDRANT_VECTOR_NAME = "product_vector"
 
+# int8 scalar quantization: 1 byte/dim in RAM, SIMD int8 scoring on the
+# Qdrant node; searches rescore the oversampled candidates with the
+# original vectors so recall is preserved.
+_SCALAR_QUANTIZATION = qmodels.ScalarQuantization(
+    scalar=qmodels.ScalarQuantizationConfig(
+        type=qmodels.ScalarType.INT8,
+        quantile=0.99,
+        always_ram=True,
+    )
+)
+_SEARCH_PARAMS = qmodels.SearchParams(
+    quantization=qmodels.QuantizationSearchParams(
+        rescore=True,
+        oversampling=2.0,
+    )
+)
+
+
+# --- Semantic query cache ---
+
+
+class _QueryCache:
+    """
+    Small in-process LRU cache for semantic_search results.
+
+    Entries are keyed by the L2-normalized query embedding: a new query
+    reuses cached Qdrant points when its cosine similarity to a cached
+    query is >= `threshold` and the search params (limit / filter) match.
+    Vectors live in one (max_entries, dim) matrix so a lookup is a single
+    matrix-vector product.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 512,
+        threshold: float = 0.97,
+        ttl_seconds: float = 300.0,
+    ) -> None:
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self) -> None:
+        self._vectors: Optional[np.ndarray] = None  # (max_entries, dim)
+        # slot -> (timestamp, params_key, results)
+        self._entries: List[Optional[Tuple[float, Any, List[qmodels.ScoredPoint]]]] = [
+            None
+        ] * self.max_entries
+        self._lru: "OrderedDict[int, None]" = OrderedDict()  # oldest first
+        self._free: List[int] = list(range(self.max_entries - 1, -1, -1))
+
+    def _drop(self, slot: int) -> None:
+        self._entries[slot] = None
+        self._vectors[slot] = 0.0
+        self._lru.pop(slot, None)
+        self._free.append(slot)
+
+    def get(
+        self, q_vec: np.ndarray, params_key: Any
+    ) -> Optional[List[qmodels.ScoredPoint]]:
+        with self._lock:
+            if not self._lru:
+                return None
+
+            # Empty slots are zero rows, so they never pass the threshold.
+            sims = self._vectors @ q_vec
+            candidates = np.flatnonzero(sims >= self.threshold)
+            now = time.monotonic()
+            for slot in candidates[np.argsort(-sims[candidates])]:
+                slot = int(slot)
+                entry = self._entries[slot]
+                if entry is None:
+                    continue
+                ts, key, results = entry
+                if now - ts > self.ttl_seconds:
+                    self._drop(slot)
+                    continue
+                if key != params_key:
+                    continue
+                self._lru.move_to_end(slot)
+                return results
+            return None
+
+    def put(
+        self,
+        q_vec: np.ndarray,
+        params_key: Any,
+        results: List[qmodels.ScoredPoint],
+    ) -> None:
+        with self._lock:
+            if self._vectors is None or self._vectors.shape[1] != q_vec.shape[0]:
+                self._reset()
+                self._vectors = np.zeros(
+                    (self.max_entries, q_vec.shape[0]), dtype=np.float32
+                )
+
+            if self._free:
+                slot = self._free.pop()
+            else:
+                slot, _ = self._lru.popitem(last=False)  # evict LRU
+
+            self._vectors[slot] = q_vec
+            self._entries[slot] = (time.monotonic(), params_key, results)
+            self._lru[slot] = None
+            self._lru.move_to_end(slot)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._reset()
+
+
+_query_cache = _QueryCache()
+
 
 def get_embedder() -> SentenceTransformer:
     """
@@ -39,6 +165,15 @@ def get_qdrant() -> QdrantClient:
         _qdrant = QdrantClient(
             url=settings.QDRANT_URL,
             api_key=settings.QDRANT_API_KEY,
+            prefer_grpc=settings.QDRANT_PREFER_GRPC,
+            grpc_port=settings.QDRANT_GRPC_PORT,
+            timeout=settings.QDRANT_TIMEOUT,
+            # keep the HTTP/2 channel warm between searches
+            grpc_options={
+                "grpc.keepalive_time_ms": 30_000,
+                "grpc.keepalive_timeout_ms": 10_000,
+                "grpc.keepalive_permit_without_calls": 1,
+            },
         )
     return _qdrant
 
@@ -47,16 +182,37 @@ def ensure_collection() -> None:
     """
     Make sure the Qdrant collection exists with correct vector size
     and named vector config.
+
+    Only checked once per process — afterwards this is a no-op, so it
+    doesn't cost a Qdrant round-trip on every search.
     """
+    global _collection_ready
+    if _collection_ready:
+        return
+
     client = get_qdrant()
-    embedder = get_embedder()
-    vector_dim = _VECTOR_DIM or embedder.get_sentence_embedding_dimension()
 
     collections = client.get_collections().collections
     names = {c.name for c in collections}
     if settings.QDRANT_COLLECTION in names:
+        # Older collections were created without quantization — enable it
+        info = client.get_collection(settings.QDRANT_COLLECTION)
+        if info.config.quantization_config is None:
+            client.update_collection(
+                collection_name=settings.QDRANT_COLLECTION,
+                quantization_config=_SCALAR_QUANTIZATION,
+            )
+        if "product_id" not in (info.payload_schema or {}):
+            _create_product_id_index(client)
+        _collection_ready = True
         return
 
+    # New collection: size it from the actual model, not a setting that
+    # may lag behind BGE_MODEL_NAME. An empty collection gets indexed next,
+    # which needs the model anyway.
+    get_embedder()
+    vector_dim = _VECTOR_DIM
+
     # Create collection with a NAMED dense vector
     client.create_collection(
         collection_name=settings.QDRANT_COLLECTION,
@@ -66,6 +222,36 @@ def ensure_collection() -> None:
                 distance=qmodels.Distance.COSINE,
             )
         },
+        quantization_config=_SCALAR_QUANTIZATION,
+    )
+    _create_product_id_index(client)
+    _collection_ready = True
+
+
+def _check_vector_size(client: QdrantClient) -> None:
+    """
+    Fail loudly if the collection was sized for a different model
+    (e.g. BGE_MODEL_NAME changed) instead of failing every upload.
+    """
+    vectors = client.get_collection(settings.QDRANT_COLLECTION).config.params.vectors
+    params = vectors.get(QDRANT_VECTOR_NAME) if isinstance(vectors, dict) else vectors
+    if params is not None and params.size != _VECTOR_DIM:
+        raise RuntimeError(
+            f"Qdrant collection '{settings.QDRANT_COLLECTION}' has {params.size}-dim "
+            f"vectors but {settings.BGE_MODEL_NAME} produces {_VECTOR_DIM}-dim "
+            "embeddings — use a new QDRANT_COLLECTION for this model."
+        )
+
+
+def _create_product_id_index(client: QdrantClient) -> None:
+    """
+    Integer payload index on product_id, used by group_by and the
+    allowed_product_ids filter in semantic_search.
+    """
+    client.create_payload_index(
+        collection_name=settings.QDRANT_COLLECTION,
+        field_name="product_id",
+        field_schema=qmodels.PayloadSchemaType.INTEGER,
     )
 
 
@@ -89,6 +275,17 @@ def _product_to_text(product: Product) -> str:
     return "\n".join([p for p in parts if p])
 
 
+# Products embedded + upserted per round-trip while indexing
+INDEX_BATCH_SIZE = 64
+
+
+def _batches(iterable: Iterable[Any], n: int) -> Iterator[List[Any]]:
+    """Yield lists of up to n items from iterable."""
+    it = iter(iterable)
+    while batch := list(itertools.islice(it, n)):
+        yield batch
+
+
 def index_all_products(db: Session, skip_if_indexed: bool = False) -> int:
     """
     Fetch all products from Neon Postgres and upsert into Qdrant.
@@ -99,7 +296,6 @@ def index_all_products(db: Session, skip_if_indexed: bool = False) -> int:
     """
     ensure_collection()
     client = get_qdrant()
-    embedder = get_embedder()
 
     if skip_if_indexed:
         info = client.get_collection(settings.QDRANT_COLLECTION)
@@ -110,22 +306,17 @@ def index_all_products(db: Session, skip_if_indexed: bool = False) -> int:
             )
             return 0
 
-    products: List[Product] = db.query(Product).all()
-    if not products:
-        return 0
-
-    ids: List[int] = []
-    vectors: List[List[float]] = []
-    payloads: List[dict] = []
-
-    texts = [_product_to_text(p) for p in products]
-    embeddings = embedder.encode(texts, normalize_embeddings=True)
-
-    for product, vector in zip(products, embeddings):
-        ids.append(product.id)
-        vectors.append(vector.tolist())
-
-        payloads.append(
+    # Model is only loaded here when we actually have to embed
+    embedder = get_embedder()
+    _check_vector_size(client)
+
+    # Stream rows and embed/upsert in small batches so peak memory stays
+    # bounded regardless of catalog size.
+    indexed = 0
+    rows = db.query(Product).yield_per(256)
+    for products in _batches(rows, INDEX_BATCH_SIZE):
+        ids: List[int] = [p.id for p in products]
+        payloads: List[dict] = [
             {
                 "product_id": product.id,
                 "title": product.title,
@@ -135,22 +326,374 @@ def index_all_products(db: Session, skip_if_indexed: bool = False) -> int:
                 "image_url": product.image_url,
                 "product_url": product.product_url,
             }
+            for product in products
+        ]
+
+        # One (batch, dim) float32 array per batch. Kept at float32: the
+        # uploader converts rows with .tolist() anyway, so a narrower dtype
+        # would only round away stored precision.
+        texts = [_product_to_text(p) for p in products]
+        embeddings = embedder.encode(
+            texts,
+            normalize_embeddings=True,
+            convert_to_numpy=True,
+            batch_size=INDEX_BATCH_SIZE,
+        ).astype(np.float32, copy=False)
+
+        # 👉 Upsert with NAMED vector
+        client.upload_collection(
+            collection_name=settings.QDRANT_COLLECTION,
+            vectors={QDRANT_VECTOR_NAME: embeddings},
+            payload=payloads,
+            ids=ids,
+            batch_size=INDEX_BATCH_SIZE,
+            wait=True,
         )
+        indexed += len(products)
 
-    # 👉 Upsert with NAMED vector
-    client.upsert(
-        collection_name=settings.QDRANT_COLLECTION,
-        points=qmodels.Batch(
-            ids=ids,
-            vectors={QDRANT_VECTOR_NAME: vectors},
-            payloads=payloads,
-        ),
+    if not indexed:
+        return 0
+
+    # Cached search results may point at stale payloads now
+    _query_cache.clear()
+
+    return indexed
+
+
+# --- Micro-batched query encoding ---
+
+# Queries arriving within the window are encoded in one forward pass
+QUERY_BATCH_MAX = 32
+QUERY_BATCH_WINDOW_S = 0.008
+
+_query_queue: Optional[asyncio.Queue] = None
+_query_worker: Optional[asyncio.Task] = None
+# Worker processes running encode() outside the API process (and its GIL).
+# None → encode in the default thread executor instead.
+_encode_pool: Optional[ProcessPoolExecutor] = None
+
+
+def _init_embedder() -> None:
+    """
+    Process-pool initializer: load the model once per worker process.
+    """
+    get_embedder()
+
+
+def _encode_batch(texts: List[str]) -> np.ndarray:
+    """
+    Encode a batch of query strings into L2-normalized float32 vectors.
+    """
+    embedder = get_embedder()
+    vectors = embedder.encode(
+        texts,
+        normalize_embeddings=True,
+        batch_size=QUERY_BATCH_MAX,
+        convert_to_numpy=True,
+    )
+    return np.asarray(vectors, dtype=np.float32)
+
+
+async def _encode_and_resolve(
+    batch: List[Tuple[str, asyncio.Future]],
+    executor: Optional[Executor],
+) -> None:
+    loop = asyncio.get_running_loop()
+    texts = [text for text, _ in batch]
+    try:
+        try:
+            vectors = await loop.run_in_executor(executor, _encode_batch, texts)
+        except BrokenProcessPool:
+            # A worker died (typically OOM-killed) and the pool is unusable
+            # from now on — switch to in-process encoding for good instead
+            # of failing every later request.
+            print("⚠️ Encode worker process died — falling back to in-process encoding.")
+            _drop_encode_pool(executor)
+            vectors = await loop.run_in_executor(None, _encode_batch, texts)
+    except Exception as e:
+        for _, fut in batch:
+            if not fut.done():
+                fut.set_exception(e)
+        return
+
+    for (_, fut), vec in zip(batch, vectors):
+        if not fut.done():
+            fut.set_result(vec)
+
+
+def _drop_encode_pool(pool: Optional[Executor]) -> None:
+    global _encode_pool
+    if pool is not None and pool is _encode_pool:
+        _encode_pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+async def _query_batch_worker(queue: asyncio.Queue) -> None:
+    """
+    Drain up to QUERY_BATCH_MAX queued queries (or whatever arrived within
+    QUERY_BATCH_WINDOW_S) and encode them with a single encode() call.
+
+    With a process pool, up to one batch per worker process is in flight
+    at once; the in-process fallback encodes one batch at a time.
+    """
+    loop = asyncio.get_running_loop()
+    slots = asyncio.Semaphore(settings.EMBEDDER_PROCESSES if _encode_pool else 1)
+    in_flight: set = set()
+
+    while True:
+        batch = [await queue.get()]
+        deadline = loop.time() + QUERY_BATCH_WINDOW_S
+        while len(batch) < QUERY_BATCH_MAX:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+
+        await slots.acquire()
+        # Re-read every batch: the pool is dropped if a worker dies
+        task = loop.create_task(_encode_and_resolve(batch, _encode_pool))
+        in_flight.add(task)
+        task.add_done_callback(in_flight.discard)
+        task.add_done_callback(lambda _: slots.release())
+
+
+def warmup_embedder() -> None:
+    """
+    Load the model and run one encode in this process, so the first
+    request doesn't pay the model load / first-forward cost.
+    """
+    get_embedder().encode(["warmup"], normalize_embeddings=True)
+
+
+async def warmup_query_encoder() -> None:
+    """
+    Start and warm every encode worker process (each loads the model in
+    its initializer). Without a pool, warm the in-process model instead —
+    the API process only needs its own copy when it does the encoding.
+    """
+    loop = asyncio.get_running_loop()
+    if _encode_pool is None:
+        await loop.run_in_executor(None, warmup_embedder)
+        return
+    await asyncio.gather(
+        *(
+            loop.run_in_executor(_encode_pool, _encode_batch, ["warmup"])
+            for _ in range(settings.EMBEDDER_PROCESSES)
+        )
     )
 
-    return len(products)
 
+def start_query_encoder() -> None:
+    """
+    Start the micro-batching worker on the running event loop
+    (called from FastAPI startup).
+    """
+    global _query_queue, _query_worker, _encode_pool
+    if _query_worker is not None:
+        return
+    if settings.EMBEDDER_PROCESSES > 0:
+        # "spawn": forking a process that already has torch loaded can hang
+        _encode_pool = ProcessPoolExecutor(
+            max_workers=settings.EMBEDDER_PROCESSES,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_embedder,
+        )
+    _query_queue = asyncio.Queue()
+    _query_worker = asyncio.get_running_loop().create_task(
+        _query_batch_worker(_query_queue)
+    )
+
+
+async def stop_query_encoder() -> None:
+    global _query_queue, _query_worker, _encode_pool
+    if _query_worker is None:
+        return
+    _query_worker.cancel()
+    try:
+        await _query_worker
+    except asyncio.CancelledError:
+        pass
+    _query_queue = None
+    _query_worker = None
+    if _encode_pool is not None:
+        _encode_pool.shutdown(wait=False, cancel_futures=True)
+        _encode_pool = None
+
+
+async def encode_query(query: str) -> np.ndarray:
+    """
+    Encode one query via the micro-batching worker.
+    Falls back to a direct (single-item) encode if the worker isn't running.
+    """
+    loop = asyncio.get_running_loop()
+    if _query_queue is None:
+        vectors = await loop.run_in_executor(None, _encode_batch, [query])
+        return vectors[0]
+
+    fut = loop.create_future()
+    await _query_queue.put((query, fut))
+    return await fut
+
+
+# --- In-memory exact search for small catalogs ---
+
+# Above this many points we keep searching in Qdrant (HNSW over network)
+LOCAL_SEARCH_MAX_POINTS = 10_000
+
+
+@dataclass
+class _LocalIndex:
+    """Whole collection held in RAM for exact inner-product search."""
+
+    vectors: np.ndarray          # (N, dim) float32, L2-normalized
+    product_ids: np.ndarray      # (N,) payload product_id, for filtering
+    point_ids: List[Any]
+    payloads: List[dict]
+
+
+_local_index: Optional[_LocalIndex] = None
 
-def semantic_search(
+
+def preload_vectors() -> int:
+    """
+    Scroll the full Qdrant collection (vectors + payloads) into memory so
+    semantic_search can run as a local matrix-vector product instead of
+    a network round-trip.
+
+    Returns number of points loaded; 0 if the collection is empty or
+    larger than LOCAL_SEARCH_MAX_POINTS (searches then stay on Qdrant).
+    """
+    global _local_index
+    ensure_collection()
+    client = get_qdrant()
+
+    info = client.get_collection(settings.QDRANT_COLLECTION)
+    if not info.points_count or info.points_count > LOCAL_SEARCH_MAX_POINTS:
+        _local_index = None
+        return 0
+
+    point_ids: List[Any] = []
+    product_ids: List[int] = []
+    payloads: List[dict] = []
+    # Filled row by row: no intermediate lists of boxed Python floats
+    matrix: Optional[np.ndarray] = None
+    n = 0
+
+    offset = None
+    while True:
+        records, offset = client.scroll(
+            collection_name=settings.QDRANT_COLLECTION,
+            with_payload=True,
+            with_vectors=[QDRANT_VECTOR_NAME],
+            limit=256,
+            offset=offset,
+        )
+        for rec in records:
+            vec = rec.vector
+            if isinstance(vec, dict):
+                vec = vec.get(QDRANT_VECTOR_NAME)
+            if vec is None:
+                continue
+            if matrix is None:
+                matrix = np.empty((info.points_count, len(vec)), dtype=np.float32)
+            elif n == matrix.shape[0]:
+                # Points were added after get_collection — grow once
+                matrix = np.concatenate([matrix, np.empty_like(matrix)])
+            matrix[n] = vec
+            n += 1
+
+            payload = rec.payload or {}
+            pid = payload.get("product_id")
+            point_ids.append(rec.id)
+            product_ids.append(-1 if pid is None else pid)
+            payloads.append(payload)
+        if offset is None:
+            break
+
+    if not n:
+        _local_index = None
+        return 0
+
+    if n < matrix.shape[0]:
+        matrix = matrix[:n].copy()
+    matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+
+    # Swap in atomically; searches in flight keep their old snapshot
+    _local_index = _LocalIndex(
+        matrix, np.asarray(product_ids, dtype=np.int64), point_ids, payloads
+    )
+    _query_cache.clear()
+    return len(point_ids)
+
+
+def _local_search(
+    index: _LocalIndex,
+    q_vec: np.ndarray,
+    limit: int,
+    allowed_product_ids: Optional[List[int]],
+) -> List[qmodels.ScoredPoint]:
+    """
+    Exact cosine search over the preloaded matrix (IndexFlatIP style):
+    one mat-vec, then argpartition for the top candidates.
+
+    Like the Qdrant group_by path, returns at most one point (the best)
+    per product_id; points without a product_id are skipped.
+    """
+    scores = index.vectors @ q_vec
+
+    # Points without product_id can't be grouped — same as group_by
+    valid = index.product_ids >= 0
+    if allowed_product_ids:
+        valid &= np.isin(index.product_ids, allowed_product_ids)
+    scores = np.where(valid, scores, -np.inf)
+    n_candidates = int(valid.sum())
+    n_points = scores.shape[0]
+
+    if min(limit, n_candidates) <= 0:
+        return []
+
+    # Several points can belong to one product: widen the top-k window
+    # until it holds `limit` distinct products (or every candidate).
+    window = min(limit, n_points)
+    while True:
+        if window < n_points:
+            top = np.argpartition(-scores, window - 1)[:window]
+        else:
+            top = np.arange(n_points)
+        top = top[np.argsort(-scores[top], kind="stable")]
+
+        picked: List[int] = []
+        seen: set = set()
+        for i in top:
+            if scores[i] == -np.inf:
+                break
+            pid = int(index.product_ids[i])
+            if pid in seen:
+                continue
+            seen.add(pid)
+            picked.append(int(i))
+            if len(picked) == limit:
+                break
+
+        if len(picked) == limit or window >= n_points:
+            break
+        window = min(window * 4, n_points)
+
+    return [
+        qmodels.ScoredPoint(
+            id=index.point_ids[i],
+            version=0,
+            score=float(scores[i]),
+            payload=index.payloads[i],
+        )
+        for i in picked
+    ]
+
+
+async def semantic_search(
     query: str,
     limit: int = 5,
     allowed_product_ids: Optional[List[int]] = None,
@@ -158,14 +701,36 @@ def semantic_search(
     """
     Run semantic search in Qdrant for a free-text query.
 
+    Returns at most one point (the best-scoring one) per product,
+    ordered by score.
+
     If allowed_product_ids is provided and non-empty, we restrict
     search to those product_ids using a Qdrant payload filter.
+
+    When the catalog was preloaded (preload_vectors), the search runs
+    in-process against the cached matrix instead of calling Qdrant.
     """
-    ensure_collection()
+    await asyncio.to_thread(ensure_collection)
     client = get_qdrant()
-    embedder = get_embedder()
 
-    q_vec = embedder.encode([query], normalize_embeddings=True)[0].tolist()
+    # float32 ndarray, handed to the client as-is (no per-element
+    # Python float boxing via .tolist())
+    q_vec = await encode_query(query)
+
+    # Near-duplicate queries (cosine >= 0.97) reuse previous Qdrant results
+    params_key = (
+        limit,
+        tuple(sorted(allowed_product_ids)) if allowed_product_ids else None,
+    )
+    cached = _query_cache.get(q_vec, params_key)
+    if cached is not None:
+        return cached
+
+    index = _local_index
+    if index is not None:
+        points = _local_search(index, q_vec, limit, allowed_product_ids)
+        _query_cache.put(q_vec, params_key, points)
+        return points
 
     query_filter: Optional[qmodels.Filter] = None
     if allowed_product_ids:
@@ -178,14 +743,21 @@ def semantic_search(
             ]
         )
 
-    # ✅ New API: use query_points (no .search anywhere)
-    resp = client.query_points(
+    # ✅ New API: grouped query_points — the server returns the best
+    #    hit for `limit` distinct products, so no client-side dedup.
+    resp = await asyncio.to_thread(
+        client.query_points_groups,
         collection_name=settings.QDRANT_COLLECTION,
+        group_by="product_id",
         query=q_vec,                      # query vector
         query_filter=query_filter,        # optional payload filter
         using=QDRANT_VECTOR_NAME,         # which named vector to use
+        search_params=_SEARCH_PARAMS,     # int8 search + rescoring
         with_payload=True,
         limit=limit,
+        group_size=1,
     )
+    points = [group.hits[0] for group in resp.groups if group.hits]
 
-    return resp.points
+    _query_cache.put(q_vec, params_key, points)
+    return points
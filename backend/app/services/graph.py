@@ -1,12 +1,21 @@
 # app/services/graph.py
+import atexit
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
 from typing import List, Dict, Any
 
-from neo4j import GraphDatabase, Driver
+from neo4j import GraphDatabase, Driver, Result, RoutingControl
 
 from app.core.config import settings
 from app.models.product import Product
 
+logger = logging.getLogger(__name__)
+
 _driver: Driver | None = None
+# First calls race in from threadpool workers; only one may build the driver
+_driver_lock = threading.Lock()
 
 
 def get_neo4j_driver() -> Driver:
@@ -15,127 +24,307 @@ def get_neo4j_driver() -> Driver:
 
     If NEO4J_ENABLED is False this should normally not be called; callers
     are expected to short-circuit before.
+
+    Creating the driver does no I/O, so the lock is only held briefly;
+    connectivity is verified once at startup (sync_products_to_graph),
+    not on this request-path getter. Pooled connections idle longer than
+    the liveness timeout are pinged before reuse, so a connection the
+    server (or a load balancer) dropped is replaced up front instead of
+    failing the next query.
     """
     global _driver
-    if _driver is None:
-        _driver = GraphDatabase.driver(
+    if _driver is not None:
+        return _driver
+    with _driver_lock:
+        if _driver is not None:
+            return _driver
+        driver = GraphDatabase.driver(
             settings.NEO4J_URI,
             auth=(settings.NEO4J_USER, settings.NEO4J_PASSWORD),
+            max_connection_pool_size=settings.NEO4J_POOL_SIZE,
+            connection_acquisition_timeout=settings.NEO4J_ACQUISITION_TIMEOUT,
+            max_transaction_retry_time=settings.NEO4J_MAX_RETRY_TIME,
+            liveness_check_timeout=settings.NEO4J_LIVENESS_CHECK_TIMEOUT,
+            keep_alive=True,
         )
-    return _driver
+        _driver = driver
+        return driver
 
 
-def close_neo4j_driver() -> None:
-    global _driver
-    if _driver is not None:
-        _driver.close()
-        _driver = None
+def _execute_read(query: str, result_transformer=Result.to_eager_result, **params):
+    """
+    Run a read query through the driver's managed execute_query API,
+    which borrows a pooled connection (no per-call session setup) and
+    retries transient failures.
+
+    result_transformer gets the live Result, so it can consume records
+    as they stream in instead of after full materialization.
+    """
+    return get_neo4j_driver().execute_query(
+        query,
+        params,
+        routing_=RoutingControl.READ,
+        database_=settings.NEO4J_DATABASE,
+        result_transformer_=result_transformer,
+    )
+
 
+def _execute_write(query: str, **params):
+    return get_neo4j_driver().execute_query(
+        query,
+        params,
+        routing_=RoutingControl.WRITE,
+        database_=settings.NEO4J_DATABASE,
+    )
 
-# ---- schema helpers (indexes optional, no UNIQUE constraints) ----
+
+def close_neo4j_driver() -> None:
+    global _driver
+    with _driver_lock:
+        if _driver is not None:
+            _driver.close()
+            _driver = None
+
+
+# Drain pooled connections on interpreter exit
+atexit.register(close_neo4j_driver)
+
+
+# ---- schema helpers (UNIQUE constraints on identity keys) ----
+
+
+# (plain index from earlier versions, UNIQUE constraint, fallback).
+# The plain index must go before a constraint can be created on the same
+# label/property. If the constraint can't be created (a graph that
+# already holds duplicate nodes), the plain index is recreated so MERGE /
+# MATCH on the key never degrade to a label scan.
+_KEY_SCHEMA = [
+    (
+        "product_id_index",
+        "CREATE CONSTRAINT product_id_unique IF NOT EXISTS "
+        "FOR (p:Product) REQUIRE p.product_id IS UNIQUE",
+        "CREATE INDEX product_id_index IF NOT EXISTS "
+        "FOR (p:Product) ON (p.product_id)",
+    ),
+    (
+        "category_name_index",
+        "CREATE CONSTRAINT category_name_unique IF NOT EXISTS "
+        "FOR (c:Category) REQUIRE c.name IS UNIQUE",
+        "CREATE INDEX category_name_index IF NOT EXISTS "
+        "FOR (c:Category) ON (c.name)",
+    ),
+    (
+        "feature_name_index",
+        "CREATE CONSTRAINT feature_name_unique IF NOT EXISTS "
+        "FOR (f:Feature) REQUIRE f.name IS UNIQUE",
+        "CREATE INDEX feature_name_index IF NOT EXISTS "
+        "FOR (f:Feature) ON (f.name)",
+    ),
+]
+
+# Lowercased copies of the searchable properties (written at upsert
+# time) get TEXT indexes, so the KG filters' CONTAINS checks are
+# index-backed instead of toLower() over a full label scan.
+_INDEXES = [
+    "CREATE TEXT INDEX product_title_lc IF NOT EXISTS "
+    "FOR (p:Product) ON (p.title_lc)",
+    "CREATE TEXT INDEX product_category_lc IF NOT EXISTS "
+    "FOR (p:Product) ON (p.category_lc)",
+    "CREATE TEXT INDEX category_name_lc IF NOT EXISTS "
+    "FOR (c:Category) ON (c.name_lc)",
+    "CREATE TEXT INDEX feature_name_lc IF NOT EXISTS "
+    "FOR (f:Feature) ON (f.name_lc)",
+    # RANGE index for the max_price predicate
+    "CREATE INDEX product_price IF NOT EXISTS "
+    "FOR (p:Product) ON (p.price)",
+]
 
 
 def ensure_schema() -> None:
     """
-    For this assignment we keep it simple:
-    - no UNIQUE constraints (they were causing SchemaConstraintValidationFailed)
-    - optionally create normal indexes (not required for correctness)
+    UNIQUE constraints on Product.product_id, Category.name and
+    Feature.name. Each one comes with a backing index, so every MERGE on
+    these keys is an index point lookup (and safe under concurrency).
+
+    A graph that already contains duplicate nodes for a key fails the
+    constraint (SchemaConstraintValidationFailed) until it is rebuilt
+    with force=True; meanwhile the key keeps a plain index.
     """
     driver = get_neo4j_driver()
-    try:
-        with driver.session() as session:
-            # Non-unique indexes (safe even if data is messy)
-            session.run(
-                "CREATE INDEX product_id_index IF NOT EXISTS "
-                "FOR (p:Product) ON (p.product_id)"
-            )
-            session.run(
-                "CREATE INDEX category_name_index IF NOT EXISTS "
-                "FOR (c:Category) ON (c.name)"
-            )
-            session.run(
-                "CREATE INDEX feature_name_index IF NOT EXISTS "
-                "FOR (f:Feature) ON (f.name)"
-            )
-    except Exception as e:
-        # Index creation failure should never break app startup
-        print("⚠️ Skipping Neo4j index creation due to error:", e)
+    with driver.session(database=settings.NEO4J_DATABASE) as session:
+        for legacy_name, constraint, fallback in _KEY_SCHEMA:
+            try:
+                session.run(f"DROP INDEX {legacy_name} IF EXISTS").consume()
+            except Exception as e:
+                logger.warning("⚠️ Could not drop legacy Neo4j index %s: %s", legacy_name, e)
+
+            try:
+                session.run(constraint).consume()
+            except Exception as e:
+                logger.warning(
+                    "⚠️ Neo4j constraint creation failed, keeping plain index %s: %s",
+                    legacy_name,
+                    e,
+                )
+                try:
+                    session.run(fallback).consume()
+                except Exception as e:
+                    logger.warning("⚠️ Could not recreate Neo4j index %s: %s", legacy_name, e)
 
+        for stmt in _INDEXES:
+            try:
+                session.run(stmt).consume()
+            except Exception as e:
+                # Schema creation failure should never break app startup
+                logger.warning("⚠️ Skipping Neo4j constraint/index creation due to error: %s", e)
+
+
+# Marker node recording that the *_lc backfill already ran on this graph
+_LC_BACKFILL_MIGRATION = "lowercase_props_v1"
 
-# ---- core write helpers ----
 
+def _backfill_lowercase_props() -> None:
+    """
+    Graphs built before the *_lc properties existed: fill them in once so
+    the KG filters (which only look at *_lc) keep matching.
+
+    The two full label scans only run until a :KgMigration marker is
+    written; after that every startup pays a single point lookup.
+    """
+    done = _execute_read(
+        "MATCH (m:KgMigration {name: $name}) RETURN 1 LIMIT 1",
+        result_transformer=lambda r: r.peek() is not None,
+        name=_LC_BACKFILL_MIGRATION,
+    )
+    if done:
+        return
 
-def _upsert_product_tx(
-    tx,
-    product_id: int,
-    title: str | None,
-    category: str | None,
-    price: float | None,
-    features: List[str],
-):
-    tx.run(
+    _execute_write(
         """
-        MERGE (p:Product {product_id: $product_id})
-        SET p.title = $title,
-            p.category = $category,
-            p.price = $price
-        """,
-        product_id=product_id,
-        title=title,
-        category=category,
-        price=price,
+        MATCH (p:Product)
+        WHERE p.title_lc IS NULL OR (p.category IS NOT NULL AND p.category_lc IS NULL)
+        SET p.title_lc = toLower(p.title),
+            p.category_lc = toLower(p.category)
+        """
+    )
+    _execute_write(
+        """
+        MATCH (n)
+        WHERE (n:Category OR n:Feature) AND n.name_lc IS NULL
+        SET n.name_lc = toLower(n.name)
+        """
+    )
+    _execute_write(
+        "MERGE (m:KgMigration {name: $name}) SET m.applied_at = datetime()",
+        name=_LC_BACKFILL_MIGRATION,
     )
 
-    if category:
-        tx.run(
-            """
-            MERGE (c:Category {name: $category})
-            MERGE (p:Product {product_id: $product_id})-[:BELONGS_TO]->(c)
-            """,
-            product_id=product_id,
-            category=category,
-        )
 
-    for feat in features:
-        tx.run(
-            """
-            MERGE (f:Feature {name: $name})
-            MERGE (p:Product {product_id: $product_id})-[:HAS_FEATURE]->(f)
-            """,
-            name=feat,
-            product_id=product_id,
-        )
+# ---- core write helpers ----
+
 
+# Products sent per UNWIND write transaction
+UPSERT_BATCH_SIZE = 1000
+# Parallel product-batch writers (each borrows its own pooled connection)
+UPSERT_WORKERS = 8
+
+
+# Distinct category / feature names are upserted once up front, so
+# each node is MERGEd once per sync instead of once per product using it.
+_UPSERT_CATEGORIES_QUERY = """
+UNWIND $names AS name
+MERGE (c:Category {name: name})
+SET c.name_lc = toLower(name)
+"""
+
+_UPSERT_FEATURES_QUERY = """
+UNWIND $names AS name
+MERGE (f:Feature {name: name})
+SET f.name_lc = toLower(name)
+"""
+
+# Upsert a whole batch of products + their edges in a single Cypher
+# round-trip. Category / Feature nodes already exist at this point, so
+# they are only MATCHed (unique-constraint point lookup), never MERGEd.
+_UPSERT_PRODUCTS_QUERY = """
+UNWIND $rows AS row
+MERGE (p:Product {product_id: row.id})
+SET p.title = row.title,
+    p.title_lc = toLower(row.title),
+    p.category = row.category,
+    p.category_lc = toLower(row.category),
+    p.price = row.price,
+    p.updated_at = row.updated_at
+WITH p, row
+CALL {
+    // changed product: drop old edges so removed features don't linger
+    WITH p
+    MATCH (p)-[old:BELONGS_TO|HAS_FEATURE]->()
+    DELETE old
+}
+CALL {
+    WITH p, row
+    MATCH (c:Category {name: row.category})
+    MERGE (p)-[:BELONGS_TO]->(c)
+}
+CALL {
+    WITH p, row
+    UNWIND row.features AS fname
+    MATCH (f:Feature {name: fname})
+    MERGE (p)-[:HAS_FEATURE]->(f)
+}
+"""
+
+
+def _batched(items: List[Any], n: int):
+    it = iter(items)
+    while batch := list(islice(it, n)):
+        yield batch
+
+
+def _write_product_batch(batch: List[Dict[str, Any]]) -> None:
+    _execute_write(_UPSERT_PRODUCTS_QUERY, rows=batch)
+
+
+def _existing_product_versions() -> Dict[int, str | None]:
+    """product_id → updated_at (ISO string) for every Product in the graph."""
+    return _execute_read(
+        "MATCH (p:Product) RETURN p.product_id AS id, p.updated_at AS updated_at",
+        result_transformer=lambda r: dict(r.values("id", "updated_at")),
+    )
 
-def _count_products_tx(tx) -> int:
-    record = tx.run("MATCH (p:Product) RETURN count(p) AS c").single()
-    return int(record["c"]) if record else 0
+
+_DELETE_PRODUCTS_QUERY = """
+UNWIND $ids AS i
+MATCH (p:Product {product_id: i})
+DETACH DELETE p
+"""
 
 
 def _delete_kg_tx(tx):
     """
-    (Currently unused)
-    Delete current KG for this app only:
-    - all Product nodes
-    - any Category/Feature nodes that become orphan.
+    Full rebuild only (force=True).
+    Delete current KG for this app only: all Product, Category and
+    Feature nodes. Categories/features are only ever attached to
+    products, so they are dropped unconditionally instead of scanning
+    for orphans after the product delete.
     """
-    # delete all Product nodes + attached relationships
     tx.run("MATCH (p:Product) DETACH DELETE p")
-    # clean up orphan categories/features (no remaining relationships)
-    tx.run(
-        """
-        MATCH (c:Category)
-        WHERE NOT (c)--()
-        DELETE c
-        """
-    )
-    tx.run(
-        """
-        MATCH (f:Feature)
-        WHERE NOT (f)--()
-        DELETE f
-        """
-    )
+    tx.run("MATCH (c:Category) DETACH DELETE c")
+    tx.run("MATCH (f:Feature) DETACH DELETE f")
+
+
+def _normalize_features(features: Any) -> List[str]:
+    """Product.features (JSON dict / list / comma string) → unique names, order kept."""
+    if isinstance(features, dict):
+        feats = [f"{k}: {v}" for k, v in features.items()]
+    elif isinstance(features, list):
+        feats = [str(x) for x in features]
+    elif isinstance(features, str):
+        feats = [f.strip() for f in features.split(",") if f.strip()]
+    else:
+        feats = []
+    return list(dict.fromkeys(feats))
 
 
 # ---- public sync + read APIs ----
@@ -144,68 +333,101 @@ def _delete_kg_tx(tx):
 def sync_products_to_graph(
     products: List[Product],
     skip_if_exists: bool = True,
+    force: bool = False,
+    prune: bool = False,
 ) -> int:
     """
     Push products into Neo4j as a small knowledge graph.
 
-    New behaviour (to avoid expensive rebuilds):
+    Incremental by default (work ∝ changed products, not catalog size):
     - If NEO4J_ENABLED=False  → skip completely.
     - If no products in DB     → skip.
-    - If ANY Product nodes already exist in Neo4j AND skip_if_exists=True
-        → assume graph is already prepared, SKIP (no rebuild, no delete).
-    - Otherwise:
-        → only upsert products (MERGE) without deleting existing graph.
+    - skip_if_exists=True      → upsert only products that are new or whose
+                                 updated_at differs from the graph copy.
+    - skip_if_exists=False     → upsert every product.
+    - prune=True               → graph Products missing from `products` are
+                                 DETACH DELETE'd. Only pass this with the
+                                 COMPLETE catalog — with a subset it would
+                                 delete everything else.
+    - force=True               → wipe the KG and rebuild it from scratch.
+
+    Returns the number of products upserted.
     """
     if not settings.NEO4J_ENABLED:
-        print("ℹ️ Neo4j disabled (NEO4J_ENABLED=False) — skipping KG sync.")
+        logger.info("ℹ️ Neo4j disabled (NEO4J_ENABLED=False) — skipping KG sync.")
         return 0
 
     if not products:
         return 0
 
-    driver = get_neo4j_driver()
+    # Whole UNWIND payload built up front, before any Neo4j round-trip.
+    rows: List[Dict[str, Any]] = [
+        {
+            "id": p.id,
+            "title": p.title,
+            "category": p.category or None,
+            "price": float(p.price) if p.price is not None else None,
+            "updated_at": p.updated_at.isoformat() if p.updated_at else None,
+            "features": _normalize_features(p.features),
+        }
+        for p in products
+    ]
+
+    # Fail fast (once, at startup) if Neo4j is unreachable
+    get_neo4j_driver().verify_connectivity()
     ensure_schema()
+    _backfill_lowercase_props()
+
+    if force:
+        logger.warning("🧨 Force rebuild — deleting existing Neo4j KG...")
+        with get_neo4j_driver().session(database=settings.NEO4J_DATABASE) as session:
+            session.execute_write(_delete_kg_tx)
+        existing: Dict[int, str | None] = {}
+    elif skip_if_exists or prune:
+        existing = _existing_product_versions()
+    else:
+        existing = {}
+
+    # 🔹 Set-diff against the graph: DB se hata hua product → delete
+    # (sirf prune=True pe), naya / badla hua product → upsert.
+    # Baaki sab untouched.
+    if prune:
+        stale_ids = list(existing.keys() - {r["id"] for r in rows})
+        for ids in _batched(stale_ids, UPSERT_BATCH_SIZE):
+            _execute_write(_DELETE_PRODUCTS_QUERY, ids=ids)
+        if stale_ids:
+            logger.info("🗑️ Removed %d stale products from Neo4j KG.", len(stale_ids))
+
+    if skip_if_exists:
+        rows = [
+            r for r in rows
+            if r["id"] not in existing or existing[r["id"]] != r["updated_at"]
+        ]
+    if not rows:
+        logger.info(
+            "ℹ️ Neo4j KG up to date (Product nodes: %d) — nothing to upsert.",
+            len(existing),
+        )
+        return 0
 
-    with driver.session() as session:
-        existing = session.execute_read(_count_products_tx)
-
-        # 🔹 IMPORTANT CHANGE:
-        # Agar graph me already koi Product nodes hain aur hum skip_if_exists=True
-        # use kar rahe hain (startup case), to direct skip kar do — mismatch
-        # check ya rebuild nahi hoga.
-        if skip_if_exists and existing > 0:
-            print(
-                f"ℹ️ Existing Neo4j KG detected "
-                f"(Product nodes: {existing}) — skipping KG sync."
-            )
-            return 0
-
-        # Agar skip_if_exists=False diya hai, to soft upsert karega
-        # (NO delete, NO full rebuild) — sirf MERGE.
-        upserted = 0
-        for p in products:
-            if isinstance(p.features, dict):
-                feats = [f"{k}: {v}" for k, v in p.features.items()]
-            elif isinstance(p.features, list):
-                feats = [str(x) for x in p.features]
-            elif isinstance(p.features, str):
-                feats = [f.strip() for f in p.features.split(",") if f.strip()]
-            else:
-                feats = []
-
-            price_val = float(p.price) if p.price is not None else None
-
-            session.execute_write(
-                _upsert_product_tx,
-                p.id,
-                p.title,
-                p.category,
-                price_val,
-                feats,
-            )
-            upserted += 1
+    # Shared nodes first: one MERGE per distinct name.
+    all_cats = sorted({r["category"] for r in rows if r["category"]})
+    all_feats = sorted({f for r in rows for f in r["features"]})
+    for names in _batched(all_cats, UPSERT_BATCH_SIZE):
+        _execute_write(_UPSERT_CATEGORIES_QUERY, names=names)
+    for names in _batched(all_feats, UPSERT_BATCH_SIZE):
+        _execute_write(_UPSERT_FEATURES_QUERY, names=names)
 
-    return upserted
+    # Then products + edges, one UNWIND transaction per batch, batches
+    # written concurrently. Shared Category/Feature nodes are only read
+    # here, so shards rarely contend; a lock deadlock is a transient
+    # error that execute_query retries on its own.
+    batches = list(_batched(rows, UPSERT_BATCH_SIZE))
+    workers = max(1, min(UPSERT_WORKERS, settings.NEO4J_POOL_SIZE, len(batches)))
+    with ThreadPoolExecutor(max_workers=workers) as ex:
+        list(ex.map(_write_product_batch, batches))
+
+    return len(rows)
 
 
 def get_candidate_product_ids_from_kg(
@@ -225,46 +447,47 @@ def get_candidate_product_ids_from_kg(
     if not settings.NEO4J_ENABLED:
         return []
 
-    driver = get_neo4j_driver()
     tags = [t.lower() for t in tags if t]
 
-    with driver.session() as session:
-        result = session.run(
-            """
-            MATCH (p:Product)
-            OPTIONAL MATCH (p)-[:BELONGS_TO]->(c:Category)
-            OPTIONAL MATCH (p)-[:HAS_FEATURE]->(f:Feature)
-            WITH p, c, f
-            WHERE
-              (
-                $category IS NULL
-                OR toLower(p.category) CONTAINS $category
-                OR (c IS NOT NULL AND toLower(c.name) CONTAINS $category)
-              )
-              AND
-              (
-                $max_price IS NULL
-                OR p.price IS NULL
-                OR p.price <= $max_price
-              )
-              AND
-              (
-                size($tags) = 0 OR
-                any(t IN $tags WHERE
-                    (f IS NOT NULL AND toLower(f.name) CONTAINS t) OR
-                    toLower(p.title) CONTAINS t OR
-                    toLower(coalesce(p.description, "")) CONTAINS t
-                )
-              )
-            RETURN DISTINCT p.product_id AS id
-            """,
-            category=(category_hint.lower() if category_hint else None),
-            max_price=max_price,
-            tags=tags,
-        )
-
-        ids: List[int] = [rec["id"] for rec in result if rec.get("id") is not None]
-        return ids
+    ids: List[int] = _execute_read(
+        """
+        MATCH (p:Product)
+        WHERE
+          (
+            $category IS NULL
+            OR p.category_lc CONTAINS $category
+            OR EXISTS {
+                MATCH (p)-[:BELONGS_TO]->(c:Category)
+                WHERE c.name_lc CONTAINS $category
+            }
+          )
+          AND
+          (
+            $max_price IS NULL
+            OR p.price IS NULL
+            OR p.price <= $max_price
+          )
+          AND
+          (
+            size($tags) = 0 OR
+            any(t IN $tags WHERE
+                p.title_lc CONTAINS t OR
+                toLower(coalesce(p.description, "")) CONTAINS t OR
+                EXISTS {
+                    MATCH (p)-[:HAS_FEATURE]->(f:Feature)
+                    WHERE f.name_lc CONTAINS t
+                }
+            )
+          )
+        RETURN p.product_id AS id
+        """,
+        category=(category_hint.lower() if category_hint else None),
+        max_price=max_price,
+        tags=tags,
+        # one column → plain list, no per-record key lookups
+        result_transformer=lambda r: r.value("id"),
+    )
+    return [i for i in ids if i is not None]
 
 
 def get_kg_context_for_products(product_ids: List[int]) -> List[str]:
@@ -280,33 +503,29 @@ def get_kg_context_for_products(product_ids: List[int]) -> List[str]:
     if not product_ids:
         return []
 
-    driver = get_neo4j_driver()
-    with driver.session() as session:
-        result = session.run(
-            """
-            MATCH (p:Product)
-            WHERE p.product_id IN $ids
-            OPTIONAL MATCH (p)-[:BELONGS_TO]->(c:Category)
-            OPTIONAL MATCH (p)-[:HAS_FEATURE]->(f:Feature)
-            RETURN p.product_id AS id,
-                   p.title AS title,
-                   collect(DISTINCT c.name) AS categories,
-                   collect(DISTINCT f.name) AS features
-            """,
-            ids=product_ids,
-        )
-
-        contexts: List[str] = []
-        for record in result:
-            title = record["title"] or ""
-            cats = [c for c in record["categories"] if c]
-            feats = [f for f in record["features"] if f]
+    # UNWIND keeps rows in $ids (relevance) order; pattern comprehensions
+    # avoid the category × feature row product of two OPTIONAL MATCHes and
+    # drop empty names in the DB (edges/names are unique, so no DISTINCT).
+    return _execute_read(
+        """
+        UNWIND $ids AS i
+        MATCH (p:Product {product_id: i})
+        RETURN p.title AS title,
+               [(p)-[:BELONGS_TO]->(c:Category) WHERE c.name <> "" | c.name] AS categories,
+               [(p)-[:HAS_FEATURE]->(f:Feature) WHERE f.name <> "" | f.name] AS features
+        """,
+        result_transformer=_format_kg_contexts,
+        ids=product_ids,
+    )
 
-            text = (
-                f"Product: {title}\n"
-                f"Categories: {', '.join(cats) if cats else 'N/A'}\n"
-                f"Features: {', '.join(feats) if feats else 'N/A'}"
-            )
-            contexts.append(text)
 
-        return contexts
+def _format_kg_contexts(result: Result) -> List[str]:
+    contexts: List[str] = []
+    # Records are tuples in RETURN order — unpack instead of key lookups
+    for title, cats, feats in result:
+        contexts.append(
+            f"Product: {title or ''}\n"
+            f"Categories: {', '.join(cats) if cats else 'N/A'}\n"
+            f"Features: {', '.join(feats) if feats else 'N/A'}"
+        )
+    return contexts
@@ -1,86 +1,229 @@
 # app/services/llm.py
-from typing import List, Optional
+from typing import AsyncIterator, List, Optional, Tuple
+import hashlib
 import logging
+import threading
 
-from groq import Groq
-from openai import OpenAI, RateLimitError, APIError
+import httpx
+from cachetools import TTLCache
+from groq import AsyncGroq
+from openai import AsyncOpenAI, RateLimitError, APIError
 
 from app.core.config import settings
 
 logger = logging.getLogger(__name__)
 
+# One pooled HTTP/2 client shared by both SDKs: keep-alive connections
+# are reused across requests instead of paying a TLS handshake each time.
+# Async SDKs: LLM calls are pure I/O, so awaiting them keeps the event
+# loop free instead of pinning a threadpool worker per call.
+http_client = httpx.AsyncClient(
+    http2=True,
+    limits=httpx.Limits(max_connections=100, max_keepalive_connections=100),
+    timeout=httpx.Timeout(30.0, connect=5.0),
+)
+
 # Initialize clients
-groq_client = Groq(api_key=settings.GROQ_API_KEY)
-openai_client = OpenAI(api_key=settings.OPENAI_API_KEY)
+groq_client = AsyncGroq(api_key=settings.GROQ_API_KEY, http_client=http_client)
+openai_client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY, http_client=http_client)
 
 PRIMARY_MODEL = "llama-3.1-8b-instant"  # 🚀 fastest, cheaper, works great
 FALLBACK_MODEL = "gpt-4.1-mini"        # light fallback
 
+# Model answers keyed by a hash of the exact prompt: same question + same
+# retrieved chunks → same prompt → no LLM round-trip. Fallback/error
+# messages are never stored, so a flaky minute doesn't stick for an hour.
+_answer_cache: TTLCache = TTLCache(maxsize=2048, ttl=3600)
+_answer_cache_lock = threading.Lock()
+
+
+# Prompt budget: prompt tokens drive LLM latency + cost, so context is
+# capped at MAX_CHUNKS chunks of at most MAX_CHARS_PER_CHUNK chars each.
+# /search sends up to 8 retrieval chunks followed by KG chunks, so the
+# cap leaves room for the KG context of the top products too.
+MAX_CHUNKS = 16
+MAX_CHARS_PER_CHUNK = 800
+
+
+# Static part of the prompt, built once at import. Keeping the instructions
+# as a fixed prefix also makes them cacheable by provider-side prompt
+# caching.
+_PROMPT_HEAD = (
+    "You are an AI fashion stylist. You must recommend outfits ONLY using the "
+    "products listed in the context below.\n\n"
+    "Rules:\n"
+    "- Suggest 2–4 suitable products from the context.\n"
+    "- If no exact match exists, recommend closest alternatives.\n"
+    "- Never say 'I don't know' if there are products in context.\n"
+    "- Keep the message short.\n\n"
+    "Context:\n"
+)
+_PROMPT_QUERY = "\n\nUser query: "
+_PROMPT_TAIL = "\n\nNow give a short, friendly recommendation:"
+
+_CHUNK_SEP = "\n\n---\n\n"
+
+# Returned without an LLM call when there is no usable context
+NO_CONTEXT_ANSWER = "I couldn't find any matching products for that request."
+
+
+def _has_context(chunks: List[str]) -> bool:
+    return any(c and c.strip() for c in chunks)
+
 
 def _build_prompt(question: str, chunks: List[str]) -> str:
     # Limit context to avoid oversized input
-    context = "\n\n---\n\n".join(chunks[:40])
-    return (
-        "You are an AI fashion stylist. You must recommend outfits ONLY using the "
-        "products listed in the context below.\n\n"
-        "Rules:\n"
-        "- Suggest 2–4 suitable products from the context.\n"
-        "- If no exact match exists, recommend closest alternatives.\n"
-        "- Never say 'I don't know' if there are products in context.\n"
-        "- Keep the message short.\n\n"
-        f"Context:\n{context}\n\n"
-        f"User query: {question}\n\n"
-        "Now give a short, friendly recommendation:"
-    )
+    context = _CHUNK_SEP.join(c[:MAX_CHARS_PER_CHUNK] for c in chunks[:MAX_CHUNKS])
+    return "".join((_PROMPT_HEAD, context, _PROMPT_QUERY, question, _PROMPT_TAIL))
 
 
-def answer_with_rag(question: str, chunks: List[str]) -> Optional[str]:
-    if not chunks:
+def _prompt_key(prompt: str) -> str:
+    return hashlib.blake2b(prompt.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def _cache_get(key: str) -> Optional[str]:
+    if not settings.LLM_CACHE_ENABLED:
         return None
+    with _answer_cache_lock:
+        return _answer_cache.get(key)
+
+
+def _cache_put(key: str, answer: str) -> None:
+    if settings.LLM_CACHE_ENABLED and answer:
+        with _answer_cache_lock:
+            _answer_cache[key] = answer
+
+
+def _primary_request(prompt: str) -> dict:
+    return dict(
+        model=PRIMARY_MODEL,
+        messages=[
+            {"role": "system", "content": "You are a helpful fashion stylist."},
+            {"role": "user", "content": prompt},
+        ],
+        temperature=0.2,
+        max_tokens=300,  # required for Groq API
+    )
+
+
+def _fallback_request(prompt: str) -> dict:
+    return dict(
+        model=FALLBACK_MODEL,
+        messages=[{"role": "user", "content": prompt}],
+        temperature=0.2,
+        max_tokens=300,
+    )
+
+
+def _fallback_error_message(e: Exception) -> str:
+    if isinstance(e, RateLimitError):
+        logger.warning(f"OpenAI quota exceeded: {e}")
+        return (
+            "I'm unable to generate the full recommendation right now — "
+            "but these products match your request!"
+        )
+    if isinstance(e, APIError):
+        logger.error(f"OpenAI API error: {e}")
+        return (
+            "Model response failed — but you can still explore the suggested products!"
+        )
+    logger.error(f"Unexpected LLM error: {e}")
+    return "I'm having trouble responding right now."
+
+
+async def answer_with_rag(question: str, chunks: List[str]) -> Tuple[str, bool]:
+    """
+    Answer from the RAG chunks — Groq first, OpenAI as fallback.
+
+    Returns (answer, from_model): from_model is False for the canned
+    no-context / fallback / error messages, so callers can avoid caching
+    a degraded response.
+    """
+    if not _has_context(chunks):
+        return NO_CONTEXT_ANSWER, False
 
     prompt = _build_prompt(question, chunks)
+    key = _prompt_key(prompt)
+    cached = _cache_get(key)
+    if cached is not None:
+        return cached, True
 
     # 🔹 First: Try Groq Instant model
     try:
         logger.info("🧠 Using Groq — llama-3.1-8b-instant")
-        resp = groq_client.chat.completions.create(
-            model=PRIMARY_MODEL,
-            messages=[
-                {"role": "system", "content": "You are a helpful fashion stylist."},
-                {"role": "user", "content": prompt},
-            ],
-            temperature=0.2,
-            max_tokens=300,  # required for Groq API
-        )
-        return resp.choices[0].message.content.strip()
-
+        resp = await groq_client.chat.completions.create(**_primary_request(prompt))
+        answer = resp.choices[0].message.content.strip()
+        _cache_put(key, answer)
+        return answer, bool(answer)
     except Exception as e:
         logger.error(f"⚠️ Groq failed! Switching to OpenAI: {e}")
 
     # 🔹 Then: fallback only if Groq failed
     try:
         logger.info("🪂 Using OpenAI fallback — GPT-4.1-mini")
-        resp = openai_client.chat.completions.create(
-            model=FALLBACK_MODEL,
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.2,
-            max_tokens=300,
-        )
-        return resp.choices[0].message.content.strip()
+        resp = await openai_client.chat.completions.create(**_fallback_request(prompt))
+        answer = resp.choices[0].message.content.strip()
+        _cache_put(key, answer)
+        return answer, bool(answer)
+    except Exception as e:
+        return _fallback_error_message(e), False
 
-    except RateLimitError as e:
-        logger.warning(f"OpenAI quota exceeded: {e}")
-        return (
-            "I'm unable to generate the full recommendation right now — "
-            "but these products match your request!"
-        )
 
-    except APIError as e:
-        logger.error(f"OpenAI API error: {e}")
-        return (
-            "Model response failed — but you can still explore the suggested products!"
+async def answer_with_rag_stream(question: str, chunks: List[str]) -> AsyncIterator[str]:
+    """Yield the answer token-by-token so callers can flush the first words early."""
+    if not _has_context(chunks):
+        yield NO_CONTEXT_ANSWER
+        return
+
+    prompt = _build_prompt(question, chunks)
+    key = _prompt_key(prompt)
+    cached = _cache_get(key)
+    if cached is not None:
+        yield cached
+        return
+
+    # Fallback sirf tab jab Groq ne ek bhi token nahi bheja —
+    # half answer ke baad switch karne se text duplicate ho jayega.
+    started = False
+    parts: List[str] = []
+    try:
+        logger.info("🧠 Streaming from Groq — llama-3.1-8b-instant")
+        stream = await groq_client.chat.completions.create(
+            **_primary_request(prompt), stream=True
         )
+        async for chunk in stream:
+            if chunk.choices:
+                started = True
+                token = chunk.choices[0].delta.content or ""
+                parts.append(token)
+                yield token
+        _cache_put(key, "".join(parts).strip())
+        return
+    except Exception as e:
+        if started:
+            logger.error(f"⚠️ Groq stream broke mid-answer: {e}")
+            return
+        logger.error(f"⚠️ Groq failed! Switching to OpenAI: {e}")
 
+    try:
+        logger.info("🪂 Streaming from OpenAI fallback — GPT-4.1-mini")
+        stream = await openai_client.chat.completions.create(
+            **_fallback_request(prompt), stream=True
+        )
+        async for chunk in stream:
+            if chunk.choices:
+                started = True
+                token = chunk.choices[0].delta.content or ""
+                parts.append(token)
+                yield token
+        _cache_put(key, "".join(parts).strip())
     except Exception as e:
-        logger.error(f"Unexpected LLM error: {e}")
-        return "I'm having trouble responding right now."
+        if started:
+            logger.error(f"OpenAI stream broke mid-answer: {e}")
+            return
+        yield _fallback_error_message(e)
+
+
+async def close_llm_clients() -> None:
+    """Close the shared HTTP client (called from FastAPI shutdown)."""
+    await http_client.aclose()